@@ -1,7 +1,15 @@
 import streamlit as st
 import requests
-import pandas as pd
-import json
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import csv
+import html
+import io
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime
 
 # Set page config
@@ -13,7 +21,7 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
+CSS = """
     <style>
     .main {
         background-color: #f8f9fa;
@@ -31,6 +39,9 @@ st.markdown("""
     .negative {
         color: #dc3545;
     }
+    .neutral {
+        color: #6c757d;
+    }
     .stock-card {
         background-color: white;
         border-radius: 10px;
@@ -46,7 +57,14 @@ st.markdown("""
         box-shadow: 0 2px 4px rgba(0,0,0,0.05);
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+# Inject the custom CSS through a cached resource so the body runs once per process;
+# Streamlit replays the cached element on later reruns so the styles stay applied
+@st.cache_resource
+def _inject_css():
+    st.markdown(CSS, unsafe_allow_html=True)
+    return True
 
 # Define the base URL
 base_url = "https://priceapi.moneycontrol.com/pricefeed/techindicator/W/"
@@ -59,68 +77,212 @@ headers = {
     'Connection': 'keep-alive'
 }
 
-# Load stock symbols from the Excel file
-@st.cache_data
+# Number of symbols fetched concurrently in multi-symbol mode
+MAX_WORKERS = 20
+
+# Shared session so NSE/MoneyControl calls reuse pooled keep-alive connections.
+# Cached as a resource so one pool survives reruns and is shared by all users.
+@st.cache_resource
+def get_session():
+    s = requests.Session()
+    s.headers.update(headers)
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=max(32, MAX_WORKERS),
+        # Absorb transient failures here instead of making the user click again.
+        # Read timeouts are not retried and connect failures only once, so a
+        # stalled host costs at most 2 x timeout. Retry-After is ignored because
+        # urllib3 would sleep for whatever the server asks, inside workers and the
+        # script run. Worst case per call is 4 attempts that each run up to the
+        # 10 s timeout before a retryable status, plus 0 + 0.8 + 1.6 s backoff,
+        # roughly 42 s.
+        max_retries=Retry(
+            total=3,
+            connect=1,
+            read=0,
+            backoff_factor=0.4,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+            respect_retry_after_header=False
+        )
+    )
+    s.mount("https://", adapter)
+    return s
+
+# NSE cookie state shared by every user of the pooled session. Kept in a cached
+# resource because module globals are rebuilt on every script rerun.
+@st.cache_resource
+def _nse_cookie_state():
+    return {'lock': threading.Lock(), 'primed': False}
+
+# Fetch the NSE homepage so the session holds the cookies the quote API expects.
+# Only the NSE fallback path calls this, so MoneyControl-only lookups never wait on NSE.
+def _prime_nse_cookies(session, force=False):
+    state = _nse_cookie_state()
+    with state['lock']:
+        if force or not state['primed']:
+            session.get("https://www.nseindia.com/", timeout=10).raise_for_status()
+            state['primed'] = True
+
+# HTML card for a single indicator, filled in with str.format_map
+INDICATOR_TMPL = (
+    '<div class="indicator-card"><h4>{name}</h4>'
+    '<p><strong>Value:</strong> {value}</p>'
+    '<p><strong>Signal:</strong> {signal}</p>'
+    '<p><strong>Action:</strong> <span class="{cls}">{action}</span></p></div>'
+)
+
+# CSS class for each indicator action; anything unrecognised renders as neutral
+ACTION_CLASS = {'buy': 'positive', 'sell': 'negative', 'neutral': 'neutral', '': 'neutral'}
+
+# Keywords used to bucket indicators by name. Momentum is checked before trend
+# so that 'MACD' is not swallowed by the 'MA' keyword.
+CATEGORY_KEYWORDS = (
+    ('momentum', ('RSI', 'MACD', 'Stochastic', 'Momentum')),
+    ('trend', ('MA', 'Moving Average', 'EMA')),
+    ('volatility', ('Bollinger', 'ATR', 'Volatility')),
+    ('volume', ('Volume', 'OBV')),
+)
+
+# Column headings, in display order; anything unmatched lands in 'other'
+CATEGORY_TITLES = {
+    'trend': "Trend Indicators",
+    'momentum': "Momentum Indicators",
+    'volatility': "Volatility Indicators",
+    'volume': "Volume Indicators",
+    'other': "Other Indicators",
+}
+
+# Load stock symbols from the CSV built from stock_symbols.xlsx (see build_symbols.py)
+@st.cache_resource
 def load_stock_symbols():
     try:
-        symbols_df = pd.read_excel('stock_symbols.xlsx')
-        return symbols_df['Symbol'].str.replace('.NS', '').tolist()
+        with open('stock_symbols.csv', newline='') as f:
+            # Tuple is immutable, so it can be shared across sessions without copying
+            return tuple(
+                s[:-3] if s.endswith('.NS') else s
+                for s in (row['Symbol'] for row in csv.DictReader(f))
+                if s
+            )
     except Exception as e:
         st.error(f"Failed to load stock symbols: {str(e)}")
-        return []
+        return ()
 
-# Function to get ISIN from NSE
-def get_isin(symbol):
+# Look up the ISIN on NSE; raises on failure so the error is not cached
+@st.cache_data(ttl=86400, show_spinner=False)
+def _lookup_isin(symbol, _session):
+    _prime_nse_cookies(_session)
+    nse_url = "https://www.nseindia.com/api/quote-equity"
+    # Pass the symbol via params so tickers such as M&M are URL-encoded
+    params = {'symbol': symbol}
+    r = _session.get(nse_url, params=params, timeout=10)
+    
+    if r.status_code in (401, 403):
+        # The NSE cookies have expired; fetch fresh ones and try once more
+        _prime_nse_cookies(_session, force=True)
+        r = _session.get(nse_url, params=params, timeout=10)
+    
+    r.raise_for_status()
+    return orjson.loads(r.content)['metadata']['isin']
+
+# Function to get ISIN from NSE; problems are appended to warnings instead of
+# being rendered, since this also runs in worker threads
+def get_isin(symbol, session, warnings):
     try:
-        # Create a session and get cookies first
-        s = requests.Session()
-        s.get("https://www.nseindia.com/", headers=headers, timeout=10)
-        
-        # Then make the API request
-        nse_url = f"https://www.nseindia.com/api/quote-equity?symbol={symbol}"
-        r = s.get(nse_url, headers=headers, timeout=10)
-        
-        if r.status_code == 200:
-            return r.json()['metadata']['isin']
-        else:
-            st.warning(f"NSE API returned status code {r.status_code} for {symbol}")
-            return None
+        return _lookup_isin(symbol, session)
     except Exception as e:
-        st.warning(f"Failed to fetch ISIN for {symbol}: {str(e)}")
+        warnings.append(f"Failed to fetch ISIN for {symbol}: {str(e)}")
         return None
 
+# Check whether a MoneyControl suggestion is for exactly this NSE symbol. The
+# symbol search is fuzzy, but each suggestion lists its codes in pdt_dis_nm,
+# e.g. "Reliance Industries&nbsp;<span>INE002A01018, RELIANCE, 500325</span>"
+def _suggestion_matches(result, symbol):
+    match = re.search(r'<span>(.*?)</span>', html.unescape(result.get('pdt_dis_nm', '')))
+    if not match:
+        return False
+    codes = {code.strip().upper() for code in match.group(1).split(',')}
+    return symbol.upper() in codes
+
+# Look up the MoneyControl sc_id; raises LookupError when nothing matches so misses are not cached
+@st.cache_data(ttl=86400, show_spinner=False)
+def _lookup_sc_id(identifier, is_isin, _session):
+    money_control_suggestion_url = 'https://www.moneycontrol.com/mccode/common/autosuggestion_solr.php'
+    params = {
+        'classic': 'true',
+        'query': identifier,
+        'type': 1 if is_isin else 2,  # 1 for ISIN, 2 for symbol
+        'format': 'json',
+    }
+    money_control_res = _session.get(money_control_suggestion_url, params=params, timeout=10)
+    
+    if money_control_res.status_code == 200:
+        results = orjson.loads(money_control_res.content) or []
+        if not is_isin:
+            # Only trust a symbol suggestion that really is this symbol; otherwise
+            # the caller falls back to the exact ISIN lookup
+            results = [result for result in results if _suggestion_matches(result, identifier)]
+        if results:
+            return results[0]['sc_id'], results[0]['stock_name']
+    raise LookupError(identifier)
+
 # Function to get sc_id from ISIN or symbol directly
-def get_sc_id(identifier, is_isin=True):
+def get_sc_id(identifier, session, warnings, is_isin=True):
     try:
-        query_type = 1 if is_isin else 2  # 1 for ISIN, 2 for symbol
-        money_control_suggestion_url = f'https://www.moneycontrol.com/mccode/common/autosuggestion_solr.php?classic=true&query={identifier}&type={query_type}&format=json'
-        money_control_res = requests.get(money_control_suggestion_url, headers=headers, timeout=10)
-        
-        if money_control_res.status_code == 200 and money_control_res.json():
-            result = money_control_res.json()[0]
-            return result['sc_id'], result['stock_name']
+        return _lookup_sc_id(identifier, is_isin, session)
+    except LookupError:
         return None, None
     except Exception as e:
-        st.warning(f"Failed to fetch MoneyControl ID for {identifier}: {str(e)}")
+        warnings.append(f"Failed to fetch MoneyControl ID for {identifier}: {str(e)}")
         return None, None
 
+# Parsed technical indicator payload plus the raw body for the "View Raw API Response" expander
+@dataclass
+class Fetched:
+    data: dict
+    raw_bytes: bytes
+
 # Function to fetch technical indicators
-def fetch_technical_indicators(sc_id):
+def fetch_technical_indicators(sc_id, session, warnings):
     try:
         url = f"{base_url}{sc_id}"
-        response = requests.get(url, headers=headers, timeout=10)
+        response = session.get(url, timeout=10)
         
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.warning(f"MoneyControl API returned status code {response.status_code}")
-            return None
+        # Transient errors were already retried by the session adapter
+        response.raise_for_status()
+        return Fetched(orjson.loads(response.content), response.content)
     except Exception as e:
-        st.warning(f"Failed to fetch technical indicators: {str(e)}")
+        warnings.append(f"Failed to fetch technical indicators: {str(e)}")
         return None
 
+# Sort indicators into categories and build their card HTML in a single pass;
+# first matching category wins
+def _bucket(indicators):
+    buckets = {category: io.StringIO() for category in CATEGORY_TITLES}
+    for indicator in indicators:
+        name = indicator.get('name', 'Indicator')
+        value = indicator.get('value', 'N/A')
+        signal = indicator.get('signal', 'N/A')
+        action = indicator.get('action', 'N/A')
+        cls = ACTION_CLASS.get(action.lower(), 'neutral')
+        
+        for category, keywords in CATEGORY_KEYWORDS:
+            if any(keyword in name for keyword in keywords):
+                break
+        else:
+            category = 'other'
+        
+        buckets[category].write(INDICATOR_TMPL.format_map({
+            'name': name,
+            'value': value,
+            'signal': signal,
+            'cls': cls,
+            'action': action,
+        }))
+    return {category: buf.getvalue() for category, buf in buckets.items()}
+
 # Function to display technical indicators
-def display_technical_indicators(data, stock_name):
+def display_technical_indicators(data, raw_bytes, stock_name):
     if not data:
         st.warning("No data available for this stock.")
         return
@@ -152,56 +314,55 @@ def display_technical_indicators(data, stock_name):
     if not indicators:
         st.warning("No technical indicators found in the response.")
         with st.expander("View Raw API Response"):
-            st.json(data)
+            # Show the body as received instead of re-serialising the parsed dict
+            st.code(raw_bytes.decode('utf-8'), language='json')
         return
     
-    # Display indicators in columns
-    col1, col2, col3 = st.columns(3)
+    buckets = _bucket(indicators)
+    
+    # Display indicators in columns, one markdown element per column
+    for col, (category, title) in zip(st.columns(len(CATEGORY_TITLES)), CATEGORY_TITLES.items()):
+        with col:
+            st.subheader(title)
+            cards = buckets[category]
+            if cards:
+                st.markdown(cards, unsafe_allow_html=True)
+
+# Function to run the full lookup pipeline for one symbol. Safe to run in a
+# worker thread: it makes no st.* calls and returns its warnings instead.
+def fetch_symbol(symbol, session):
+    warnings = []
     
-    with col1:
-        st.subheader("Trend Indicators")
-        for indicator in indicators:
-            if 'MA' in indicator.get('name', '') or 'Moving Average' in indicator.get('name', ''):
-                with st.container():
-                    st.markdown(f"""
-                    <div class="indicator-card">
-                        <h4>{indicator.get('name', 'Indicator')}</h4>
-                        <p><strong>Value:</strong> {indicator.get('value', 'N/A')}</p>
-                        <p><strong>Signal:</strong> {indicator.get('signal', 'N/A')}</p>
-                        <p><strong>Action:</strong> <span class="{'positive' if indicator.get('action', '').lower() == 'buy' else 'negative'}">{indicator.get('action', 'N/A')}</span></p>
-                    </div>
-                    """, unsafe_allow_html=True)
+    # First try to find the stock on MoneyControl by symbol directly
+    sc_id, stock_name = get_sc_id(symbol, session, warnings, is_isin=False)
     
-    with col2:
-        st.subheader("Momentum Indicators")
-        for indicator in indicators:
-            if 'RSI' in indicator.get('name', '') or 'MACD' in indicator.get('name', ''):
-                with st.container():
-                    st.markdown(f"""
-                    <div class="indicator-card">
-                        <h4>{indicator.get('name', 'Indicator')}</h4>
-                        <p><strong>Value:</strong> {indicator.get('value', 'N/A')}</p>
-                        <p><strong>Signal:</strong> {indicator.get('signal', 'N/A')}</p>
-                        <p><strong>Action:</strong> <span class="{'positive' if indicator.get('action', '').lower() == 'buy' else 'negative'}">{indicator.get('action', 'N/A')}</span></p>
-                    </div>
-                    """, unsafe_allow_html=True)
+    if not sc_id:
+        # Fallback to resolving the ISIN via NSE if the symbol search failed
+        isin = get_isin(symbol, session, warnings)
+        if isin:
+            sc_id, stock_name = get_sc_id(isin, session, warnings, is_isin=True)
     
-    with col3:
-        st.subheader("Other Indicators")
-        for indicator in indicators:
-            if 'MA' not in indicator.get('name', '') and 'RSI' not in indicator.get('name', '') and 'MACD' not in indicator.get('name', ''):
-                with st.container():
-                    st.markdown(f"""
-                    <div class="indicator-card">
-                        <h4>{indicator.get('name', 'Indicator')}</h4>
-                        <p><strong>Value:</strong> {indicator.get('value', 'N/A')}</p>
-                        <p><strong>Signal:</strong> {indicator.get('signal', 'N/A')}</p>
-                        <p><strong>Action:</strong> <span class="{'positive' if indicator.get('action', '').lower() == 'buy' else 'negative'}">{indicator.get('action', 'N/A')}</span></p>
-                    </div>
-                    """, unsafe_allow_html=True)
+    if not sc_id:
+        return None, None, warnings
+    
+    # Finally get technical indicators
+    fetched = fetch_technical_indicators(sc_id, session, warnings)
+    return stock_name or symbol, fetched, warnings
+
+# Function to show the result of fetch_symbol; runs on the script thread only
+def show_symbol_result(symbol, stock_name, fetched, warnings):
+    for message in warnings:
+        st.warning(message)
+    if stock_name is None:
+        st.error(f"Could not find {symbol} on MoneyControl.")
+    elif fetched:
+        display_technical_indicators(fetched.data, fetched.raw_bytes, stock_name)
+    else:
+        st.error(f"Failed to fetch technical indicators for {symbol}.")
 
 # Main app
 def main():
+    _inject_css()
     st.title("📈 Stock Technical Indicators Dashboard")
     st.markdown("Get technical analysis indicators for Indian stocks from MoneyControl")
     
@@ -209,48 +370,44 @@ def main():
     stock_symbols = load_stock_symbols()
     
     if not stock_symbols:
-        st.error("No stock symbols loaded. Please check the Excel file.")
+        st.error("No stock symbols loaded. Please check stock_symbols.csv.")
         st.stop()
     
     # Search options
-    selected_symbol = st.selectbox("Select a stock symbol:", stock_symbols)
+    search_mode = st.radio("Search mode:", ["Single Symbol", "Multiple Symbols"], horizontal=True)
     
-    if st.button("Get Technical Indicators"):
-        with st.spinner(f"Fetching data for {selected_symbol}..."):
-            try:
-                # First try to get ISIN from NSE
-                isin = get_isin(selected_symbol)
-                
-                # Then get sc_id from MoneyControl - first try with ISIN, then fallback to symbol
-                sc_id, stock_name = None, None
-                if isin:
-                    sc_id, stock_name = get_sc_id(isin, is_isin=True)
-                
-                if not sc_id:
-                    # Fallback to search by symbol if ISIN search failed
-                    sc_id, stock_name = get_sc_id(selected_symbol, is_isin=False)
-                
-                if sc_id:
-                    # Finally get technical indicators
-                    data = fetch_technical_indicators(sc_id)
-                    
-                    if data:
-                        display_technical_indicators(data, stock_name or selected_symbol)
-                    else:
-                        st.error("Failed to fetch technical indicators.")
-                else:
-                    st.error("Could not find stock on MoneyControl.")
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
+    if search_mode == "Single Symbol":
+        selected_symbol = st.selectbox("Select a stock symbol:", stock_symbols)
+        
+        if st.button("Get Technical Indicators"):
+            with st.spinner(f"Fetching data for {selected_symbol}..."):
+                try:
+                    stock_name, fetched, warnings = fetch_symbol(selected_symbol, get_session())
+                    show_symbol_result(selected_symbol, stock_name, fetched, warnings)
+                except Exception as e:
+                    st.error(f"An error occurred: {str(e)}")
+    else:
+        selected_symbols = st.multiselect("Select stock symbols:", stock_symbols)
+        
+        if st.button("Get Technical Indicators") and selected_symbols:
+            session = get_session()
+            with st.spinner(f"Fetching data for {len(selected_symbols)} symbols..."):
+                with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(selected_symbols))) as ex:
+                    futures = {ex.submit(fetch_symbol, s, session): s for s in selected_symbols}
+                    # Render each symbol as soon as its pipeline finishes; all st.* calls
+                    # stay on this thread so each warning lands next to its own symbol
+                    for future in as_completed(futures):
+                        symbol = futures[future]
+                        try:
+                            stock_name, fetched, warnings = future.result()
+                            show_symbol_result(symbol, stock_name, fetched, warnings)
+                        except Exception as e:
+                            st.error(f"An error occurred for {symbol}: {str(e)}")
     
     # Add footer
-    st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #666; font-size: 14px;">
-        <p>Data provided by MoneyControl API | Updated at {}</p>
-        <p>Note: This app is for educational purposes only. Not investment advice.</p>
-    </div>
-    """.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S")), unsafe_allow_html=True)
+    st.divider()
+    st.caption(f"Data provided by MoneyControl API | Updated at {datetime.now():%Y-%m-%d %H:%M:%S}")
+    st.caption("Note: This app is for educational purposes only. Not investment advice.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,23 @@
+import sys
+
+import pandas as pd
+
+# Convert the Excel symbol list into the CSV the app reads at startup.
+# app.py only reads stock_symbols.csv: editing stock_symbols.xlsx without
+# running this script again leaves the app on the old symbol list.
+#
+# Needs the build requirements: pip install -r requirements-build.txt
+# Run with --check to verify the CSV is in sync without rewriting it.
+def main():
+    symbols_df = pd.read_excel('stock_symbols.xlsx', usecols=['Symbol'])
+    
+    if '--check' in sys.argv[1:]:
+        csv_df = pd.read_csv('stock_symbols.csv', usecols=['Symbol'])
+        if not symbols_df.equals(csv_df):
+            sys.exit("stock_symbols.csv is out of date; run python build_symbols.py")
+        return
+    
+    symbols_df.to_csv('stock_symbols.csv', index=False)
+
+if __name__ == "__main__":
+    main()